@@ -62,6 +62,9 @@ setup(
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Topic :: Software Development :: Libraries :: Python Modules"],
+    extras_require={
+        "orjson": ["orjson"]
+    },
     tests_require=[
         "responses",
         "testfixtures",
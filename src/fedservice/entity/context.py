@@ -1,4 +1,6 @@
+import copy
 import json
+import os
 from typing import Callable
 from typing import List
 from typing import Optional
@@ -66,6 +68,8 @@ class FederationContext(ImpExp):
         self.trusted_roots = trusted_roots or config.get('trusted_roots', {})
 
         self.trust_chain = {}
+        # ((file name, mtime, size, inode), parsed content) of the last read trust mark file
+        self._trust_marks_file = (None, None)
         # self.issuer = self.entity_id
 
         self.claims = FederationEntityClaims(prefer=preference)
@@ -181,11 +185,20 @@ class FederationContext(ImpExp):
         else:
             raise ValueError("trusted_roots")
 
+    def _load_trust_marks_file(self, file_name: str) -> list:
+        # The file is only parsed again if it has changed
+        _stat = os.stat(file_name)
+        _key = (file_name, _stat.st_mtime_ns, _stat.st_size, _stat.st_ino)
+        if self._trust_marks_file[0] != _key:
+            with open(file_name) as fp:
+                self._trust_marks_file = (_key, json.load(fp))
+        return self._trust_marks_file[1]
+
     def get_trust_marks(self) -> Optional[list]:
         if self.trust_marks == None:
             return []
         elif isinstance(self.trust_marks, str):
-            return json.loads(open(self.trust_marks).read())
+            return copy.deepcopy(self._load_trust_marks_file(self.trust_marks))
         elif isinstance(self.trust_marks, list):
             return self.trust_marks
         elif isinstance(self.trust_marks, Callable):
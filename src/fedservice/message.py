@@ -1,5 +1,4 @@
 """ Classes and functions used to describe information in an OpenID Connect Federation."""
-import contextlib
 import json
 import logging
 from urllib.parse import parse_qs
@@ -43,17 +42,43 @@ SINGLE_REQUIRED_DICT = (dict, True, msg_ser_json, dict_deser, False)
 LOGGER = logging.getLogger(__name__)
 
 
+class _FrozenCParamMixin:
+    """
+    Snapshots the c_param keys when a class is created. c_param is not changed after the class
+    body has been executed so membership tests can use the frozen copy.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._c_param_keys = frozenset(cls.c_param)
+
+    def extra(self):
+        _keys = type(self)._c_param_keys
+        return {key: val for key, val in self._dict.items() if key not in _keys}
+
+
 def _payload_from_jws(token):
     """
     Local helper to decode a compact JWS and return its payload as dict.
     Replaces dependency on fedservice.entity.function.get_payload to avoid cycles.
     """
-    with contextlib.suppress(AttributeError, UnicodeDecodeError):
-        token = token.decode()
+    if isinstance(token, (bytes, bytearray)):
+        token = token.decode("ascii")  # JWS compact serialization is ASCII-only
     _jwt = factory(token)
     return _jwt.jwt.payload()
 
 
+_SCALAR_DISPATCH_JSON = {
+    str: lambda v: [json.loads(v)],
+    dict: lambda v: [v],
+}
+
+_SCALAR_DISPATCH_FORM = {
+    str: lambda v: [parse_qs(v)],
+    dict: lambda v: [v],
+}
+
+
 def dict_list_deser(val, sformat="dict"):
     res = []
     if isinstance(val, list):
@@ -65,23 +90,35 @@ def dict_list_deser(val, sformat="dict"):
                     res.append(json.loads(v))
             elif isinstance(v, dict):
                 res.append(v)
-    else:
-        if isinstance(val, str):
-            if sformat == "urlencoded":
-                res = [parse_qs(val)]
-            else:
-                res = [json.loads(val)]
-        elif isinstance(val, dict):
-            res = [val]
-
+        return res
+
+    _dispatch = _SCALAR_DISPATCH_FORM if sformat == "urlencoded" else _SCALAR_DISPATCH_JSON
+    _func = _dispatch.get(type(val))
+    if _func:
+        return _func(val)
+    elif isinstance(val, dict):  # dict subclasses
+        return [val]
     return res
 
 
+def _trust_mark_columns(trust_marks):
+    """
+    Splits a list of trust mark objects into two flat lists, one with the trust mark identifiers
+    and one with the trust marks, in one pass.
+    """
+    _ids = []
+    _vals = []
+    for _tm in trust_marks:
+        _ids.append(_tm["trust_mark_id"])
+        _vals.append(_tm["trust_mark"])
+    return _ids, _vals
+
+
 REQUIRED_LIST_OF_DICT = ([dict], True, ser_any_list, dict_list_deser, False)
 OPTIONAL_LIST_OF_DICT = ([dict], False, ser_any_list, dict_list_deser, False)
 
 
-class AuthorizationServerMetadata(Message):
+class AuthorizationServerMetadata(_FrozenCParamMixin, Message):
     """Metadata for an OAuth2 Authorization Server. With Federation additions"""
     c_param = {
         "issuer": SINGLE_REQUIRED_STRING,
@@ -148,7 +185,7 @@ class InformationalMetadataExtensions(Message):
     }
 
 
-class FederationEntity(InformationalMetadataExtensions):
+class FederationEntity(_FrozenCParamMixin, InformationalMetadataExtensions):
     """Class representing Federation Entity metadata."""
     c_param = InformationalMetadataExtensions.c_param.copy()
     c_param.update({
@@ -371,7 +408,7 @@ SINGLE_REQUIRED_METADATA = (Message, True, msg_ser, metadata_deser, False)
 SINGLE_OPTIONAL_METADATA = (Message, False, msg_ser, metadata_deser, False)
 
 
-class Policy(Message):
+class Policy(_FrozenCParamMixin, Message):
     """The metadata policy verbs."""
     c_param = {
         "subset_of": OPTIONAL_LIST_OF_STRINGS,
@@ -384,21 +421,27 @@ class Policy(Message):
     }
 
     def verify(self, **kwargs):
-        _extra_parameters = list(self.extra().keys())
-        if _extra_parameters:
-            _critical = kwargs.get("policy_language_crit")
+        _extras = self.extra()
+        if not _extras:
+            return
+        _critical = kwargs.get("policy_language_crit")
+        if not _critical:
             if _critical is None:
-                pass
-            elif not _critical:
-                raise ValueError("Empty list not allowed for 'policy_language_crit'")
-            else:
-                _musts = set(_critical).intersection(_extra_parameters)
-                _known = kwargs.get("known_policy_extensions")
-                if _known:
-                    if set(_known).issuperset(set(_musts)) is False:
-                        raise UnknownCriticalExtension(_musts.difference(set(_known)))
-                else:
-                    raise UnknownCriticalExtension(_musts.intersection(_extra_parameters))
+                return
+            raise ValueError("Empty list not allowed for 'policy_language_crit'")
+
+        _extra_keys = _extras.keys()  # dict_keys already behaves like a set
+        _must = [c for c in _critical if c in _extra_keys]
+        if not _must:
+            return
+        _known = kwargs.get("known_policy_extensions")
+        if not _known:
+            raise UnknownCriticalExtension(_must)
+        if not isinstance(_known, (set, frozenset)):
+            _known = frozenset(_known)
+        _unknown = [m for m in _must if m not in _known]
+        if _unknown:
+            raise UnknownCriticalExtension(_unknown)
 
 
 def policy_deser(val, sformat="json"):
@@ -424,6 +467,7 @@ class MetadataPolicy(Message):
     def verify(self, **kwargs):
         for typ, _policy in self.items():
             for attr, item in _policy.items():
+                # Constructing the Policy type checks the values of the operators
                 _p = Policy(**item)
                 _p.verify(**kwargs)
 
@@ -500,7 +544,7 @@ class TrustMarkOwners(Message):
                     raise MissingRequiredAttribute("jwks")
 
 
-class EntityStatement(JsonWebToken):
+class EntityStatement(_FrozenCParamMixin, JsonWebToken):
     """The Entity Statement"""
     c_param = JsonWebToken.c_param.copy()
     c_param.update({
@@ -519,21 +563,27 @@ class EntityStatement(JsonWebToken):
     def verify(self, **kwargs):
         super(EntityStatement, self).verify(**kwargs)
 
-        _extra_parameters = list(self.extra().keys())
-        if _extra_parameters:
-            _critical = self.get("crit")
+        _extras = self.extra()
+        if not _extras:
+            return
+        _critical = self.get("crit")
+        if not _critical:
             if _critical is None:
-                pass
-            elif not _critical:
-                raise ValueError("Empty list not allowed for 'crit'")
-            else:
-                _musts = set(_critical).intersection(_extra_parameters)
-                _known = kwargs.get("known_extensions")
-                if _known:
-                    if set(_known).issuperset(set(_musts)) is False:
-                        raise UnknownCriticalExtension(_musts.difference(set(_known)))
-                else:
-                    raise UnknownCriticalExtension(_musts.intersection(_extra_parameters))
+                return
+            raise ValueError("Empty list not allowed for 'crit'")
+
+        _extra_keys = _extras.keys()  # dict_keys already behaves like a set
+        _must = [c for c in _critical if c in _extra_keys]
+        if not _must:
+            return
+        _known = kwargs.get("known_extensions")
+        if not _known:
+            raise UnknownCriticalExtension(_must)
+        if not isinstance(_known, (set, frozenset)):
+            _known = frozenset(_known)
+        _unknown = [m for m in _must if m not in _known]
+        if _unknown:
+            raise UnknownCriticalExtension(_unknown)
 
 
 class EntityConfiguration(EntityStatement):
@@ -563,21 +613,18 @@ class EntityConfiguration(EntityStatement):
         # It only checks that the necessary claims are present
         _trust_marks = self.get("trust_marks")
         if _trust_marks:
-            for _tm in _trust_marks:
-                _trust_mark = None
-                if isinstance(_tm["trust_mark"], str):
-                    _payload = _payload_from_jws(_tm["trust_mark"])
-                    if _payload["trust_mark_id"] != _tm["trust_mark_id"]:
-                        raise ValueError("trust_mark_is values does not match")
-                    _trust_mark = TrustMark(**_payload)
-                elif isinstance(_tm["trust_mark"], dict):
-                    if _tm["trust_mark"]["trust_mark_id"] != _tm["trust_mark_id"]:
-                        raise ValueError("trust_mark_is values does not match")
-                    _trust_mark = TrustMark(**_tm["trust_mark"])
+            _tm_ids, _tm_vals = _trust_mark_columns(_trust_marks)
+            for _tm_id, _tm_val in zip(_tm_ids, _tm_vals):
+                if isinstance(_tm_val, str):
+                    _payload = _payload_from_jws(_tm_val)
+                elif isinstance(_tm_val, dict):
+                    _payload = _tm_val
                 else:
                     raise ValueError("Trust mark has a format I didn't expect")
 
-                _trust_mark.verify()
+                if _payload["trust_mark_id"] != _tm_id:
+                    raise ValueError("trust_mark_is values does not match")
+                TrustMark(**_payload).verify()
 
 class SubordinateStatement(EntityStatement):
     c_param = EntityStatement.c_param.copy()
@@ -617,7 +664,7 @@ class TrustMarkDelegation(Message):
                 raise Expired()
 
 
-class TrustMark(JsonWebToken):
+class TrustMark(_FrozenCParamMixin, JsonWebToken):
     c_param = JsonWebToken.c_param.copy()
     c_param.update({
         "sub": SINGLE_REQUIRED_STRING,
@@ -1,49 +1,191 @@
+import io
 import json
+import mmap
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from cryptojwt.jwt import utc_time_sans_frac
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(data):
+    # The stdlib decoder doesn't accept memoryviews
+    return json.loads(bytes(data))
+
+
+def _json_dumpb(info: dict) -> bytes:
+    # The same compact layout as orjson, so the files look the same whichever is used
+    return json.dumps(info, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# orjson is an optional extra, used for the records when it is installed
+if orjson:
+    _loads = orjson.loads
+    _dumpb = orjson.dumps
+else:
+    _loads = _json_loads
+    _dumpb = _json_dumpb
+
+
+# Files are scanned sequentially, a large buffer means few read calls
+READ_BUFFER_SIZE = 1 << 20
+
+_OPEN_BRACE = ord("{")
+
+# Bytes that can't be copied verbatim into a JSON string
+_NEEDS_ESCAPE = re.compile(rb'[\x00-\x1f\x7f-\xff]')
+
+
+def _json_string(line: bytes) -> bytes:
+    """Returns a line as a JSON string."""
+    if _NEEDS_ESCAPE.search(line):
+        return json.dumps(line.decode()).encode()
+    return b'"' + line.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+def _forward_lines(file_name, start: Optional[int] = 0, stop: Optional[int] = None,
+                   needle: Optional[bytes] = None):
+    """
+    Yields (offset, line) for the non-empty lines of a file between start and stop. The lines
+    are memoryviews into a memory map of the file so no copy is made per line. The map is
+    released together with the last view, which means a line must not be kept after the next
+    one has been fetched.
+    If a needle is given only lines that contains it are returned.
+    """
+    if os.path.getsize(file_name) <= start:  # Nothing new, and an empty file can't be mapped
+        return
+
+    with open(file_name, "rb") as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    size = len(mm) if stop is None else min(stop, len(mm))
+    if needle is None:
+        pos = start
+        while pos < size:
+            end = mm.find(b"\n", pos, size)
+            if end == -1:
+                end = size
+            # Records start with '{', anything else may be a blank line
+            if end > pos and (mm[pos] == _OPEN_BRACE or mm[pos:end].strip()):
+                yield pos, view[pos:end]
+            pos = end + 1
+        return
+
+    # The needle is searched for in the whole map, line boundaries are only looked for
+    # around a hit
+    hit = mm.find(needle, start, size)
+    while hit != -1:
+        pos = mm.rfind(b"\n", start, hit) + 1 or start
+        end = mm.find(b"\n", hit, size)
+        if end == -1:
+            end = size
+        yield pos, view[pos:end]
+        hit = mm.find(needle, end, size)
+
+
+def _index_entry(tm_info: dict, offset: int) -> tuple:
+    _exp = tm_info.get("exp")
+    return tm_info.get("iat") or 0, _exp is None, offset, _exp
+
 
 class FileDB(object):
 
-    def __init__(self, **kwargs):
+    def __init__(self, fsync: Optional[bool] = False, **kwargs):
         self.config = kwargs
+        self.fsync = fsync
+        # trust_mark_id -> ((st_dev, st_ino), indexed size, {sub: [entry, ...]}) where an entry
+        # is (iat, exp is None, offset, exp). The tuples are ordered so that the largest one is
+        # the newest trust mark, one without expiration time winning a tie.
+        # Other instances and processes may append to the same file, so the index is brought
+        # up to date from the file before it is used.
+        self._index = {}
+        self._lock = threading.Lock()
         for trust_mark_id, file_name in self.config.items():
             if not os.path.exists(file_name):
                 # Only need to touch it
                 fp = open(file_name, "w")
                 fp.close()
 
+    def _append(self, trust_mark_id: str, data: bytes):
+        # Must be called with the lock held. os.write may write less than it was given, so
+        # it's called until everything is written.
+        with open(self.config[trust_mark_id], "ab", buffering=0) as fp:
+            fd = fp.fileno()
+            _data = memoryview(data)
+            while _data:
+                _data = _data[os.write(fd, _data):]
+            if self.fsync:
+                os.fsync(fd)
+
+    def _get_index(self, trust_mark_id: str) -> dict:
+        # Must be called with the lock held. A file that was replaced or truncated is indexed
+        # from scratch, one that has grown only from where the index ended.
+        _stat = os.stat(self.config[trust_mark_id])
+        _file_id = (_stat.st_dev, _stat.st_ino)
+        _cached = self._index.get(trust_mark_id)
+        if _cached and _cached[0] == _file_id and _cached[1] <= _stat.st_size:
+            _, _start, _subs = _cached
+            if _start == _stat.st_size:
+                return _subs
+        else:
+            _start, _subs = 0, {}
+
+        for offset, line in _forward_lines(self.config[trust_mark_id], _start, _stat.st_size):
+            _tmi = _loads(line)
+            _subs.setdefault(_tmi["sub"], []).append(_index_entry(_tmi, offset))
+        self._index[trust_mark_id] = (_file_id, _stat.st_size, _subs)
+        return _subs
+
     def add(self, tm_info: dict):
-        trust_mark_id = tm_info['trust_mark_id']
-        # adds a line with info about a trust mark info to the end of a file
-        with open(self.config[trust_mark_id], "a") as fp:
-            fp.write(json.dumps(tm_info) + '\n')
+        # adds a line with info about a trust mark info to the end of a file. The index picks
+        # it up the next time it's used.
+        with self._lock:
+            self._append(tm_info['trust_mark_id'], _dumpb(tm_info) + b"\n")
 
-    def _match(self, sub, iat, tmi):
-        if sub == tmi["sub"]:
-            if iat:
-                if iat == tmi['iat']:
-                    return True
-            else:
-                return True
-        return False
+    def _active(self, exp, now: int) -> bool:
+        if exp and now > exp:
+            return False
+        return True
+
+    def _scan(self, trust_mark_id: str, sub: str) -> list:
+        # Collects the subject's entries straight from the file. Only lines that contain the
+        # subject are JSON decoded. Non-ASCII subjects may be written escaped or not, so those
+        # lines are all decoded.
+        needle = json.dumps(sub).encode() if sub.isascii() else None
+        _entries = []
+        for offset, line in _forward_lines(self.config[trust_mark_id], needle=needle):
+            _tmi = _loads(line)
+            if _tmi["sub"] == sub:
+                _entries.append(_index_entry(_tmi, offset))
+        return _entries
 
     def find(self, trust_mark_id: str, sub: str, iat: Optional[int] = 0):
-        with open(self.config[trust_mark_id], "r") as fp:
-            # Get the last issued
-            for line in reversed(list(fp)):
-                _tmi = json.loads(line.rstrip())
-
-                if 'exp' in _tmi:
-                    now = utc_time_sans_frac()
-                    if now > _tmi["exp"]:
-                        return False
-
-                if self._match(sub, iat, _tmi):
-                    return True
-        return False
+        now = utc_time_sans_frac()
+        with self._lock:
+            if trust_mark_id in self._index:
+                _entries = self._get_index(trust_mark_id).get(sub)
+            else:
+                # Cold start. The answer comes from a scan for the subject, the index is built
+                # so that the lookups that follow don't have to read the file.
+                _entries = self._scan(trust_mark_id, sub)
+                self._get_index(trust_mark_id)
+
+        if not _entries:
+            return False
+        if iat:
+            _entries = [_entry for _entry in _entries if _entry[0] == iat]
+            if not _entries:
+                return False
+        # Get the last issued, plain tuple comparison so no key function is needed
+        _exp = max(_entries)[3]
+        return self._active(_exp, now)
 
     def __contains__(self, item):
         return item in self.config
@@ -51,73 +193,88 @@ class FileDB(object):
     def id_keys(self):
         return self.config.keys()
 
+    @staticmethod
+    def _read_lines(file_name: str) -> list:
+        with open(file_name, "r", buffering=READ_BUFFER_SIZE) as fp:
+            return [line.rstrip() for line in fp]
+
     def dump(self):
-        res = {}
-        for entity_id in self.config.keys():
-            res[entity_id] = []
-            with open(self.config[entity_id], "r") as fp:
-                for line in list(fp):
-                    res[entity_id].append(line.rstrip())
-        return res
+        if len(self.config) <= 1:
+            return {entity_id: self._read_lines(file_name)
+                    for entity_id, file_name in self.config.items()}
+
+        # File reads release the GIL so the files can be read in parallel
+        with ThreadPoolExecutor(max_workers=min(8, len(self.config))) as executor:
+            futures = {entity_id: executor.submit(self._read_lines, file_name)
+                       for entity_id, file_name in self.config.items()}
+            return {entity_id: future.result() for entity_id, future in futures.items()}
 
     def dumps(self):
-        return json.dumps(self.dump())
+        # The lines are already JSON documents, so they are copied into the output as JSON
+        # strings instead of being parsed and encoded again. Like dump() blank lines are kept
+        # as empty strings, which makes this the same as json.dumps(self.dump()).
+        buf = io.BytesIO()
+        buf.write(b"{")
+        for i, entity_id in enumerate(self.config):
+            if i:
+                buf.write(b", ")
+            buf.write(json.dumps(entity_id).encode())
+            buf.write(b": [")
+            first = True
+            with open(self.config[entity_id], "rb", buffering=READ_BUFFER_SIZE) as fp:
+                for raw in fp:
+                    if not first:
+                        buf.write(b", ")
+                    buf.write(_json_string(raw.rstrip()))
+                    first = False
+            buf.write(b"]")
+        buf.write(b"}")
+        return buf.getvalue().decode()
 
     def load(self, info):
         for entity_id in self.config.keys():
-            with open(self.config[entity_id], "a") as fp:
-                for tm_info in info[entity_id]:
-                    fp.write(tm_info + '\n')
+            _lines = "".join(f"{tm_info}\n" for tm_info in info[entity_id])
+            with self._lock:
+                self._append(entity_id, _lines.encode())
 
     def loads(self, str):
         self.load(json.loads(str))
 
     def list(self, trust_mark_id: str, sub: Optional[str] = ""):
-        res = []
-        try:
-            with open(self.config[trust_mark_id], "r") as fp:
-                # Get the last issued
-                for line in reversed(list(fp)):
-                    _tmi = json.loads(line.rstrip())
-                    if _tmi["sub"] not in res:
-                        if sub:
-                            if _tmi["sub"] == sub:
-                                res.append(_tmi["sub"])
-                        else:
-                            res.append(_tmi["sub"])
-        except KeyError as err:
-            pass
-
-        return res
+        if trust_mark_id not in self.config:
+            return []
+
+        with self._lock:
+            _index = self._get_index(trust_mark_id)
+            if sub:
+                return [sub] if sub in _index else []
+            # Last issued first
+            return sorted(_index, key=lambda _sub: _index[_sub][-1][2], reverse=True)
 
 
 class SimpleDB(object):
 
     def __init__(self):
+        # trust_mark_id -> sub -> trust mark info
         self._db = {}
 
     def add(self, tm_info: dict):
-        if tm_info['trust_mark_id'] in self._db:
-            self._db[tm_info['trust_mark_id']].append({tm_info['sub']: tm_info})
-        else:
-            self._db[tm_info['trust_mark_id']] = {tm_info["sub"]: tm_info}
+        self._db.setdefault(tm_info['trust_mark_id'], {})[tm_info['sub']] = tm_info
 
     def list(self, trust_mark_id, sub: Optional[str] = ""):
+        _subs = self._db.get(trust_mark_id, {})
         if sub:
-            if self._db[trust_mark_id].get(sub, None):
+            if sub in _subs:
                 return [sub]
-        elif trust_mark_id in self._db:
-            return self._db[trust_mark_id]
+            return []
+        return list(_subs.keys())
 
     def find(self, trust_mark_id, sub: str, iat: Optional[int] = 0) -> bool:
-        _tmi = self._db[trust_mark_id].get(sub, None)
+        _tmi = self._db.get(trust_mark_id, {}).get(sub)
         if _tmi:
             if iat:
-                if iat == _tmi["iat"]:
-                    return True
-            else:
-                return True
-
+                return iat == _tmi.get("iat")
+            return True
         return False
 
     def keys(self):
@@ -18,6 +18,21 @@ from fedservice.trust_mark_entity.context import TrustMarkContext
 
 logger = logging.getLogger(__name__)
 
+
+def _packer(unit, keyjar, entity_id):
+    """
+    Returns a JWT packer for the keyjar and issuer. It's kept on the unit that signs with it
+    and reused for as long as the keyjar and issuer stay the same.
+    """
+    _cached = getattr(unit, "_jwt_packer", None)
+    if _cached and _cached[0] is keyjar and _cached[1] == entity_id:
+        return _cached[2]
+
+    packer = JWT(key_jar=keyjar, iss=entity_id)
+    unit._jwt_packer = (keyjar, entity_id, packer)
+    return packer
+
+
 def create_trust_mark(keyjar, entity_id, **kwargs):
     packer = JWT(key_jar=keyjar, iss=entity_id)
     return packer.pack(payload=kwargs)
@@ -91,7 +106,7 @@ class TrustMarkEntity(Unit):
         self.issued.add(content)
 
         _federation_entity = get_federation_entity(self)
-        packer = JWT(key_jar=_federation_entity.keyjar, iss=_federation_entity.entity_id)
+        packer = _packer(self, _federation_entity.keyjar, _federation_entity.entity_id)
         return packer.pack(payload=content)
 
     def dump_trust_marks(self):
@@ -116,7 +131,7 @@ class TrustMarkEntity(Unit):
         _entity_id = self.upstream_get("attribute", 'entity_id')
         _keyjar = self.upstream_get('attribute', 'keyjar')
 
-        packer = JWT(key_jar=_keyjar, iss=_entity_id)
+        packer = _packer(self, _keyjar, _entity_id)
         if 'sub' not in kwargs:
             kwargs['sub'] = _entity_id
         return packer.pack(payload=kwargs)
@@ -197,7 +212,7 @@ class SelfSignedTrustMarkEntity(Unit):
         self.issued.append(content)
 
         _federation_entity = get_federation_entity(self)
-        packer = JWT(key_jar=_federation_entity.keyjar, iss=_federation_entity.entity_id)
+        packer = _packer(self, _federation_entity.keyjar, _federation_entity.entity_id)
         _trust_mark = packer.pack(payload=content)
         entity = self.upstream_get("unit")
         entity.context.trust_marks.append(_trust_mark)
@@ -4,21 +4,17 @@ from typing import List
 from typing import Optional
 from typing import Union
 
-from cryptojwt import JWT
 from idpyoidc.message import Message
 from idpyoidc.message import oidc
 from idpyoidc.server.endpoint import Endpoint
 
 from fedservice.message import TrustMarkRequest
+# Part of this module's public names
+from fedservice.trust_mark_entity.entity import create_trust_mark
 
 logger = logging.getLogger(__name__)
 
 
-def create_trust_mark(keyjar, entity_id, **kwargs):
-    packer = JWT(key_jar=keyjar, iss=entity_id)
-    return packer.pack(payload=kwargs)
-
-
 class TrustMark(Endpoint):
     request_cls = TrustMarkRequest
     name = "trust_mark"
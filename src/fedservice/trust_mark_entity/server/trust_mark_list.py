@@ -4,17 +4,14 @@ from typing import Callable
 from typing import Optional
 from typing import Union
 
-from cryptojwt import JWT
 from idpyoidc.message import Message
 from idpyoidc.message import oidc
 from idpyoidc.server.endpoint import Endpoint
 
-logger = logging.getLogger(__name__)
-
+# Part of this module's public names
+from fedservice.trust_mark_entity.entity import create_trust_mark
 
-def create_trust_mark(keyjar, entity_id, **kwargs):
-    packer = JWT(key_jar=keyjar, iss=entity_id)
-    return packer.pack(payload=kwargs)
+logger = logging.getLogger(__name__)
 
 
 class TrustMarkList(Endpoint):
@@ -37,11 +34,16 @@ class TrustMarkList(Endpoint):
                         **kwargs) -> dict:
         _trust_mark_entity = self.upstream_get("unit")
 
-        if 'sub' in request and 'trust_mark_id' in request:
-            if _trust_mark_entity.find(request['trust_mark_id'], request['sub']):
-                return {"response_msg": json.dumps([request["sub"]])}
-        elif 'trust_mark_id' in request:
-            _lst = _trust_mark_entity.list(request["trust_mark_id"])
+        _trust_mark_id = request.get('trust_mark_id')
+        if not _trust_mark_id:
+            return {"response_msg": []}
+
+        _sub = request.get('sub')
+        if _sub:
+            if _trust_mark_entity.find(_trust_mark_id, _sub):
+                return {"response_msg": json.dumps([_sub])}
+        else:
+            _lst = _trust_mark_entity.list(_trust_mark_id)
             if _lst:
                 return {"response_msg": json.dumps(_lst)}
 
@@ -3,17 +3,14 @@ from typing import Callable
 from typing import Optional
 from typing import Union
 
-from cryptojwt import JWT
 from idpyoidc.message import Message
 from idpyoidc.message import oidc
 from idpyoidc.server.endpoint import Endpoint
 
-logger = logging.getLogger(__name__)
-
+# Part of this module's public names
+from fedservice.trust_mark_entity.entity import create_trust_mark
 
-def create_trust_mark(keyjar, entity_id, **kwargs):
-    packer = JWT(key_jar=keyjar, iss=entity_id)
-    return packer.pack(payload=kwargs)
+logger = logging.getLogger(__name__)
 
 
 class TrustMarkStatus(Endpoint):
@@ -1,9 +1,18 @@
+import copy
+import json
 import os
+from contextlib import contextmanager
+from unittest import mock
+from urllib.parse import urlencode
 
+import requests
+
+from cryptojwt.utils import b64d
 from cryptojwt.utils import importer
 
 from fedservice.entity import FederationEntity
 from fedservice.entity.utils import get_federation_entity
+from fedservice.entity_statement.cache import ESCache
 
 CRYPT_CONFIG = {
     "kwargs": {
@@ -27,7 +36,13 @@ RESPONSE_TYPES_SUPPORTED = [
 ]
 
 
-def create_trust_chain_messages(leaf, *entity):
+def create_trust_chain_messages(leaf, *entity, include_sub_query=False):
+    """
+    Returns the entity configurations and subordinate statements of a trust chain keyed by
+    the URL they are fetched from. With include_sub_query the fetch URLs carry the sub query
+    parameter, the way the collector asks for them, which keeps statements from the same
+    fetch endpoint about different subordinates apart.
+    """
     where_and_what = {}
 
     if isinstance(leaf, str):
@@ -58,11 +73,105 @@ def create_trust_chain_messages(leaf, *entity):
         else:
             _sub = entity[n - 1].entity_id
         _req = _endpoint.parse_request({'iss': ent.entity_id, 'sub': _sub})
-        where_and_what[_endpoint.full_path] = _endpoint.process_request(_req)["response_msg"]
+        if include_sub_query:
+            _url = f"{_endpoint.full_path}?{urlencode({'sub': _sub})}"
+        else:
+            _url = _endpoint.full_path
+        where_and_what[_url] = _endpoint.process_request(_req)["response_msg"]
 
     return where_and_what
 
 
+def trust_mark_db_in(config, path):
+    """
+    Returns a copy of a federation configuration where the files of the trust mark issuers'
+    FileDB are kept in the directory path.
+    """
+    _config = {_id: copy.deepcopy(_conf) for _id, _conf in config.items()}
+    for _conf in _config.values():
+        _tme = _conf.get("kwargs", {}).get("trust_mark_entity", {})
+        _db = _tme.get("kwargs", {}).get("trust_mark_db")
+        if _db and _db["class"].endswith(".FileDB"):
+            _db["kwargs"] = {_tm_id: os.path.join(path, _file) for _tm_id, _file in
+                             _db["kwargs"].items()}
+    return _config
+
+
+def token_jwks_in(config, path):
+    """
+    Returns a copy of a federation configuration where the key files of the token handlers
+    are kept in the directory path.
+    """
+    _config = {_id: copy.deepcopy(_conf) for _id, _conf in config.items()}
+    for _conf in _config.values():
+        _etc = _conf.get("kwargs", {}).get("entity_type_config", {})
+        _jwks_def = _etc.get("token_handler_args", {}).get("jwks_def")
+        if _jwks_def and "private_path" in _jwks_def:
+            _jwks_def["private_path"] = os.path.join(path, _jwks_def["private_path"])
+    return _config
+
+
+def reset_trust_chain_collectors(*entities):
+    """
+    Empties the caches of the entities' trust chain collectors. Used when a federation is
+    shared between tests.
+    """
+    for ent in entities:
+        _function = get_federation_entity(ent).function
+        _collector = getattr(_function, "trust_chain_collector", None) if _function else None
+        if _collector:
+            _collector.config_cache = ESCache(allowed_delta=_collector.allowed_delta)
+            _collector.entity_statement_cache = ESCache(allowed_delta=_collector.allowed_delta)
+
+
+def jws_payload(token):
+    """
+    Returns the payload of a compact JWS. The signature is not verified, this is only for
+    looking at what was signed.
+    """
+    return json.loads(b64d(token.split(".")[1].encode()))
+
+
+@contextmanager
+def fast_http_mock(url_map, content_type="application/json"):
+    """
+    Stands in for responses.RequestsMock when all that is needed is to hand back a known body
+    for a known URL. Every request is a lookup in url_map, first on the full URL and then, as
+    RequestsMock does for URLs registered without a query, on the URL minus the query part.
+    The responses are built once, up front. Like RequestsMock it fails on unknown URLs and on
+    URLs never asked for.
+    """
+    _responses = {}
+    for _url, _body in url_map.items():
+        _resp = requests.Response()
+        _resp.status_code = 200
+        _resp.url = _url
+        _resp.headers["Content-Type"] = content_type
+        _resp._content = _body.encode() if isinstance(_body, str) else _body
+        _resp.encoding = "utf-8"
+        _responses[_url] = _resp
+
+    _fetched = set()
+
+    def _send(session, request, **kwargs):
+        _url = request.url
+        if _url not in _responses:
+            _url = _url.split("?", 1)[0]
+            if _url not in _responses:
+                raise requests.exceptions.ConnectionError(
+                    f"No mocked response for {request.url}")
+        _resp = _responses[_url]
+        _fetched.add(_url)
+        _resp.request = request
+        return _resp
+
+    with mock.patch.object(requests.sessions.Session, "send", _send):
+        yield
+
+    _not_fetched = set(_responses) - _fetched
+    assert not _not_fetched, f"Not all requests were made: {sorted(_not_fetched)}"
+
+
 def create_trust_chain(leaf, *entity):
     chain = []
 
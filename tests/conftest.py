@@ -0,0 +1,26 @@
+import pytest
+
+from tests import trust_mark_db_in
+from tests.build_federation import build_federation
+
+
+@pytest.fixture(scope="session", autouse=True)
+def working_directory(tmp_path_factory):
+    """
+    Runs the tests in a directory of their own. Files that the libraries create relative to
+    the working directory, like the default private/token_jwks.json of an OP's token handler,
+    are then not shared between parallel test runs.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("cwd"))
+        yield
+
+
+@pytest.fixture(scope="module")
+def federation(request, tmp_path_factory):
+    """
+    The federation described by the FEDERATION_CONFIG of the test module, built once per
+    module. The trust mark issuers' FileDB files are kept in a temporary directory.
+    """
+    _path = tmp_path_factory.mktemp("trust_mark_db")
+    return build_federation(trust_mark_db_in(request.module.FEDERATION_CONFIG, _path))
@@ -1,5 +1,6 @@
 import pytest
 from cryptojwt.jwt import utc_time_sans_frac
+from idpyoidc.exception import DecodeError
 
 from fedservice.entity_statement.constraints import calculate_path_length
 from fedservice.entity_statement.constraints import excluded
@@ -8,6 +9,7 @@ from fedservice.entity_statement.constraints import update_naming_constraints
 from fedservice.exception import UnknownCriticalExtension
 from fedservice.message import Constraints
 from fedservice.message import EntityStatement
+from fedservice.message import MetadataPolicy
 from fedservice.message import NamingConstraints
 from fedservice.message import SubordinateStatement
 
@@ -298,3 +300,20 @@ def test_policy_language_crit_not_supported():
 
     with pytest.raises(UnknownCriticalExtension):
         _statement.verify()
+
+
+@pytest.mark.parametrize("operator, exception", [
+    ({"essential": "maybe"}, ValueError),
+    ({"subset_of": 5}, DecodeError),
+])
+def test_metadata_policy_malformed_operator(operator, exception):
+    with pytest.raises(exception):
+        MetadataPolicy(**{"openid_relying_party": {"grant_types": operator}}).verify()
+
+
+def test_metadata_policy_wellformed_operator():
+    MetadataPolicy(**{
+        "openid_relying_party": {
+            "grant_types": {"subset_of": ["authorization_code"], "essential": True}
+        }
+    }).verify()
@@ -10,7 +10,6 @@ from fedservice.defaults import federation_endpoints
 from fedservice.defaults import federation_services
 from fedservice.entity.utils import get_federation_entity
 from tests import CRYPT_CONFIG
-from tests.build_federation import build_federation
 
 BASE_PATH = os.path.abspath(os.path.dirname(__file__))
 ROOT_DIR = os.path.join(BASE_PATH, "base_data")
@@ -84,7 +83,7 @@ FEDERATION_CONFIG = {
 class TestFederationStatement(object):
 
     @pytest.fixture(autouse=True)
-    def create_endpoint(self):
+    def create_endpoint(self, federation):
         #              TA
         #          +---|---+
         #          |       |
@@ -92,7 +91,6 @@ class TestFederationStatement(object):
         #          |
         #          OC
 
-        federation = build_federation(FEDERATION_CONFIG)
         self.ta = federation[TA_ID]
         self.oc = federation[OC_ID]
         self.im = federation[IM_ID]
@@ -9,6 +9,7 @@ from fedservice.defaults import federation_services
 from fedservice.message import TrustMark
 from fedservice.message import TrustMarkRequest
 from tests import create_trust_chain_messages
+from tests import trust_mark_db_in
 from tests.build_federation import build_federation
 
 KEYSPEC = [
@@ -98,8 +99,8 @@ FEDERATION_CONFIG = {
 class TestSignedTrustMark():
 
     @pytest.fixture(autouse=True)
-    def create_entities(self):
-        self.federation_entity = build_federation(FEDERATION_CONFIG)
+    def create_entities(self, tmp_path):
+        self.federation_entity = build_federation(trust_mark_db_in(FEDERATION_CONFIG, tmp_path))
         self.ta = self.federation_entity[TA_ID]
         self.tmi = self.federation_entity[TRUST_MARK_ISSUER_ID]
 
@@ -198,7 +199,7 @@ class TestSignedTrustMark():
                 trust_mark=_trust_mark, trust_anchor=self.ta.entity_id)
 
         assert verified_trust_mark
-        assert set(verified_trust_mark.keys()) == {'iat', 'iss', 'trust_mark_id', 'sub', 'ref'}
+        assert set(verified_trust_mark.keys()) == {'iat', 'exp', 'iss', 'trust_mark_id', 'sub', 'ref'}
 
     def test_metadata(self):
         _metadata = self.tmi.get_metadata()
@@ -1,18 +1,30 @@
+import json
 import os
 
+import pytest
 from cryptojwt.jwt import utc_time_sans_frac
 
+from fedservice import trust_mark_entity
 from fedservice.trust_mark_entity import FileDB
 
-BASE_PATH = os.path.abspath(os.path.dirname(__file__))
+SIRTFI = "https://refeds.org/sirtfi"
 
 
-def test_add_and_find():
-    file_name = os.path.join(BASE_PATH, 'sirtfi')
-    try:
-        os.unlink(file_name)
-    except FileNotFoundError:
-        pass
+@pytest.fixture(autouse=True, params=["orjson", "json"])
+def codec(request, monkeypatch):
+    # Every test is run with orjson, if it's installed, and with the stdlib json module
+    if request.param == "orjson":
+        orjson = pytest.importorskip("orjson")
+        monkeypatch.setattr(trust_mark_entity, "_loads", orjson.loads)
+        monkeypatch.setattr(trust_mark_entity, "_dumpb", orjson.dumps)
+    else:
+        monkeypatch.setattr(trust_mark_entity, "_loads", trust_mark_entity._json_loads)
+        monkeypatch.setattr(trust_mark_entity, "_dumpb", trust_mark_entity._json_dumpb)
+    return request.param
+
+
+def test_add_and_find(tmp_path):
+    file_name = str(tmp_path / 'sirtfi')
 
     _db = FileDB(**{
         "https://refeds.org/sirtfi": file_name
@@ -26,3 +38,172 @@ def test_add_and_find():
 
     res = _db.find(trust_mark_id="https://refeds.org/sirtfi", sub="https://example.com")
     assert res
+
+
+def test_shared_file(tmp_path):
+    # Two instances, as in two worker processes, using the same file
+    file_name = str(tmp_path / "sirtfi")
+    _db_a = FileDB(**{SIRTFI: file_name})
+    _db_b = FileDB(**{SIRTFI: file_name})
+
+    _now = utc_time_sans_frac()
+    _db_a.add({"trust_mark_id": SIRTFI, "sub": "x", "iat": _now})
+    assert _db_b.list(SIRTFI) == ["x"]
+
+    _db_a.add({"trust_mark_id": SIRTFI, "sub": "y", "iat": _now})
+    assert _db_b.find(SIRTFI, "y")
+    assert _db_b.list(SIRTFI) == ["y", "x"]
+
+
+def test_dumps_is_json_of_dump(tmp_path):
+    file_name = tmp_path / "sirtfi"
+    # A blank line, a non-ASCII subject and no newline after the last record
+    file_name.write_text(
+        '{"trust_mark_id": "https://refeds.org/sirtfi", "sub": "https://example.com", "iat": 1}\n'
+        '\n'
+        '{"trust_mark_id": "https://refeds.org/sirtfi", "sub": "https://ex\u00e4mple.org", '
+        '"iat": 2}', encoding="utf-8")
+    _db = FileDB(**{SIRTFI: str(file_name)})
+
+    _dump = _db.dump()
+    assert len(_dump[SIRTFI]) == 3
+    assert _dump[SIRTFI][1] == ""
+    assert _db.dumps() == json.dumps(_dump)
+
+
+def test_record_layout():
+    # The records are written the same way whether orjson is used or not
+    orjson = pytest.importorskip("orjson")
+    _info = {"trust_mark_id": SIRTFI, "sub": "https://exämple.org", "iat": 1,
+             "ref": "a\"b\\c\n"}
+    assert trust_mark_entity._json_dumpb(_info) == orjson.dumps(_info)
+
+
+def test_short_writes(tmp_path, monkeypatch):
+    file_name = tmp_path / "sirtfi"
+    _db = FileDB(**{SIRTFI: str(file_name)})
+    _records = [json.dumps({"trust_mark_id": SIRTFI, "sub": f"https://{i}.example.org", "iat": i})
+                for i in range(1, 4)]
+
+    _write = os.write
+    with monkeypatch.context() as m:
+        # Never writes more than 7 bytes at a time
+        m.setattr(os, "write", lambda fd, data: _write(fd, bytes(data[:7])))
+        _db.load({SIRTFI: _records})
+
+    assert _db.dump() == {SIRTFI: _records}
+
+
+def test_newest_by_iat(tmp_path):
+    # The newest trust mark is the one with the latest iat, not the last line in the file
+    file_name = str(tmp_path / "sirtfi")
+    _now = utc_time_sans_frac()
+    FileDB(**{SIRTFI: file_name}).load({SIRTFI: [
+        json.dumps({"trust_mark_id": SIRTFI, "sub": "x", "iat": _now + 100}),
+        json.dumps({"trust_mark_id": SIRTFI, "sub": "x", "iat": _now - 100, "exp": _now - 50})
+    ]})
+
+    _db = FileDB(**{SIRTFI: file_name})
+    assert _db.find(SIRTFI, "x")
+    assert not _db.find(SIRTFI, "x", iat=_now - 100)
+    # Once the index is built
+    _db.add({"trust_mark_id": SIRTFI, "sub": "y", "iat": _now})
+    assert _db.list(SIRTFI)
+    assert _db.find(SIRTFI, "x")
+    assert not _db.find(SIRTFI, "x", iat=_now - 100)
+
+
+def _cold_and_warm(file_name):
+    # One instance that has not built its index and one that has
+    _cold = FileDB(**{SIRTFI: file_name})
+    _warm = FileDB(**{SIRTFI: file_name})
+    _warm.list(SIRTFI)
+    return _cold, _warm
+
+
+def test_find_iat_and_expiry(tmp_path):
+    file_name = str(tmp_path / "sirtfi")
+    _now = utc_time_sans_frac()
+    _db = FileDB(**{SIRTFI: file_name})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://a.example.org", "iat": _now - 10})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://b.example.org", "iat": _now - 10,
+             "exp": _now - 5})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://a.example.org", "iat": _now,
+             "exp": _now + 100})
+
+    _cases = [
+        ("https://a.example.org", 0, True),
+        ("https://a.example.org", _now, True),
+        ("https://a.example.org", _now - 10, True),
+        ("https://a.example.org", _now + 1, False),
+        # Expired
+        ("https://b.example.org", 0, False),
+        # Unknown
+        ("https://c.example.org", 0, False),
+        # A subject that is a prefix of another one
+        ("https://a.example", 0, False),
+    ]
+    for _sub, _iat, _found in _cases:
+        # A new instance for every case so each of them is also answered on a cold start
+        for _db in _cold_and_warm(file_name):
+            assert _db.find(SIRTFI, _sub, iat=_iat) is _found
+            # After a find the index is there for the lookups that follow
+            assert SIRTFI in _db._index
+
+
+def test_list(tmp_path):
+    file_name = str(tmp_path / "sirtfi")
+    _now = utc_time_sans_frac()
+    _db = FileDB(**{SIRTFI: file_name})
+    for _sub in ["https://a.example.org", "https://b.example.org", "https://a.example.org"]:
+        _db.add({"trust_mark_id": SIRTFI, "sub": _sub, "iat": _now})
+
+    for _db in _cold_and_warm(file_name):
+        # Last issued first
+        assert _db.list(SIRTFI) == ["https://a.example.org", "https://b.example.org"]
+        assert _db.list(SIRTFI, "https://b.example.org") == ["https://b.example.org"]
+        assert _db.list(SIRTFI, "https://c.example.org") == []
+        assert _db.list("https://example.org/unknown") == []
+
+
+def test_dump_load(tmp_path):
+    _now = utc_time_sans_frac()
+    _db = FileDB(**{SIRTFI: str(tmp_path / "sirtfi")})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://a.example.org", "iat": _now})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://exämple.org", "iat": _now})
+
+    _db2 = FileDB(**{SIRTFI: str(tmp_path / "sirtfi2")})
+    _db2.loads(_db.dumps())
+    assert _db2.dump() == _db.dump()
+    assert _db2.dumps() == _db.dumps()
+    assert _db2.find(SIRTFI, "https://exämple.org")
+    assert _db2.list(SIRTFI) == ["https://exämple.org", "https://a.example.org"]
+
+
+def test_blank_lines_and_no_trailing_newline(tmp_path):
+    file_name = tmp_path / "sirtfi"
+    _now = utc_time_sans_frac()
+    file_name.write_text(
+        "\n" + json.dumps({"trust_mark_id": SIRTFI, "sub": "https://a.example.org", "iat": _now})
+        + "\n  \n\n"
+        + json.dumps({"trust_mark_id": SIRTFI, "sub": "https://b.example.org", "iat": _now}))
+
+    for _db in _cold_and_warm(str(file_name)):
+        assert _db.find(SIRTFI, "https://a.example.org")
+        assert _db.find(SIRTFI, "https://b.example.org")
+        assert _db.list(SIRTFI) == ["https://b.example.org", "https://a.example.org"]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_non_ascii_subject(tmp_path, ensure_ascii):
+    # The subject may have been written escaped or not
+    file_name = tmp_path / "sirtfi"
+    _now = utc_time_sans_frac()
+    file_name.write_text(
+        json.dumps({"trust_mark_id": SIRTFI, "sub": "https://exämple.org", "iat": _now},
+                   ensure_ascii=ensure_ascii) + "\n", encoding="utf-8")
+
+    for _db in _cold_and_warm(str(file_name)):
+        assert _db.find(SIRTFI, "https://exämple.org")
+        assert not _db.find(SIRTFI, "https://example.org")
+        assert _db.list(SIRTFI) == ["https://exämple.org"]
@@ -0,0 +1,40 @@
+from cryptojwt.jwt import utc_time_sans_frac
+
+from fedservice.trust_mark_entity import SimpleDB
+
+SIRTFI = "https://refeds.org/sirtfi"
+
+
+def test_add_twice():
+    _db = SimpleDB()
+    _now = utc_time_sans_frac()
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://example.com", "iat": _now})
+    # A second trust mark of the same type used to fail
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://example.org", "iat": _now + 1})
+
+    assert _db.find(SIRTFI, "https://example.com")
+    assert _db.find(SIRTFI, "https://example.org", iat=_now + 1)
+    assert not _db.find(SIRTFI, "https://example.org", iat=_now)
+    assert not _db.find(SIRTFI, "https://example.net")
+    assert _db.list(SIRTFI) == ["https://example.com", "https://example.org"]
+    assert _db.list(SIRTFI, "https://example.org") == ["https://example.org"]
+    assert _db.list(SIRTFI, "https://example.net") == []
+
+
+def test_getitem_is_live():
+    _db = SimpleDB()
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://example.com", "iat": 1})
+    _db[SIRTFI]["https://example.org"] = {"trust_mark_id": SIRTFI, "sub": "https://example.org",
+                                         "iat": 2}
+    assert _db.find(SIRTFI, "https://example.org", iat=2)
+
+
+def test_dumps_loads():
+    _db = SimpleDB()
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://example.com", "iat": 1})
+    _db.add({"trust_mark_id": SIRTFI, "sub": "https://exämple.org", "iat": 2})
+
+    _db2 = SimpleDB()
+    _db2.loads(_db.dumps())
+    assert _db2.dump() == _db.dump()
+    assert _db2.find(SIRTFI, "https://exämple.org", iat=2)
@@ -1,8 +1,7 @@
 import os
+from types import MappingProxyType
 
 import pytest
-import responses
-from cryptojwt.jws.jws import factory
 from idpyoidc.client.defaults import DEFAULT_KEY_DEFS
 from idpyoidc.client.defaults import DEFAULT_OIDC_SERVICES
 from idpyoidc.message.oidc import AuthorizationRequest
@@ -10,11 +9,15 @@ from idpyoidc.message.oidc import AuthorizationRequest
 from fedservice.defaults import DEFAULT_OIDC_FED_SERVICES
 from fedservice.entity.function import get_verified_trust_chains
 from . import create_trust_chain_messages
-from .build_federation import build_federation
+from . import fast_http_mock
+from . import jws_payload
+from . import reset_trust_chain_collectors
 
 BASE_PATH = os.path.abspath(os.path.dirname(__file__))
 ROOT_DIR = os.path.join(BASE_PATH, "base_data")
 
+ENTITY_STATEMENT_TYPE = "application/entity-statement+jwt"
+
 TA_ID = "https://ta.example.org"
 RP_ID = "https://rp.example.org"
 OP_ID = "https://op.example.org"
@@ -38,10 +41,9 @@ FE_FUNCTIONS = {
     }
 }
 
-OIDC_SERVICE = DEFAULT_OIDC_SERVICES.copy()
-OIDC_SERVICE.update(DEFAULT_OIDC_FED_SERVICES)
+OIDC_SERVICE = {**DEFAULT_OIDC_SERVICES, **DEFAULT_OIDC_FED_SERVICES}
 
-FEDERATION_CONFIG = {
+FEDERATION_CONFIG = MappingProxyType({
     TA_ID: {
         "entity_type": "trust_anchor",
         "subordinates": [RP_ID, OP_ID],
@@ -98,161 +100,139 @@ FEDERATION_CONFIG = {
                 "entity_configuration"]
         }
     }
+})
+
+
+RP_REGISTRATION_REQUEST_CLAIMS = frozenset([
+    'application_type',
+    'client_registration_types',
+    'default_max_age',
+    'grant_types',
+    'id_token_signed_response_alg',
+    'jwks',
+    'redirect_uris',
+    'request_object_signing_alg',
+    'response_modes',
+    'response_types',
+    'subject_type',
+    'token_endpoint_auth_method',
+    'token_endpoint_auth_signing_alg',
+    'userinfo_signed_response_alg'
+])
+
+RP_REGISTRATION_RESPONSE_CLAIMS = RP_REGISTRATION_REQUEST_CLAIMS | {
+    'client_id',
+    'client_id_issued_at',
+    'client_secret',
+    'client_secret_expires_at'
 }
 
 
+@pytest.fixture(scope="module")
+def federation(federation):
+    # The RP registers with the OP
+    _context = federation[RP_ID]["openid_relying_party"].context
+    _context.issuer = OP_ID
+    _response_types = _context.get_preference(
+        "response_types_supported", _context.supports().get("response_types_supported", [])
+    )
+    _context.construct_uris(_response_types)
+    federation[RP_ID]["federation_entity"].get_service(
+        "entity_configuration").upstream_get("context").issuer = OP_ID
+    return federation
+
+
+@pytest.fixture(scope="module")
+def chain_messages(federation):
+    # The statements of the trust chains OP->TA and RP->TA, keyed on the leaf
+    return {_id: create_trust_chain_messages(federation[_id], federation[TA_ID])
+            for _id in [OP_ID, RP_ID]}
+
+
+@pytest.fixture(scope="module")
+def op_metadata(federation, chain_messages):
+    # The OP's metadata from the trust chain OP->TA as seen by the RP
+    with fast_http_mock(chain_messages[OP_ID], content_type=ENTITY_STATEMENT_TYPE):
+        _trust_chains = get_verified_trust_chains(federation[RP_ID], OP_ID)
+    return _trust_chains[0].metadata
+
+
+@pytest.fixture(scope="module")
+def registration_request(federation, op_metadata):
+    # The RP's registration request, signed once for both tests
+    _rp = federation[RP_ID]
+    # The OIDC client and the federation client have their own contexts, both point at the
+    # same metadata dictionary
+    _rp["openid_relying_party"].context.server_metadata = \
+        _rp["federation_entity"].client.context.server_metadata = op_metadata
+
+    _service = _rp["federation_entity"].get_service("registration")
+    _sc = _service.upstream_get("context")
+    _service.endpoint = _sc.get_metadata_claim("federation_registration_endpoint")
+
+    # construct the client registration request
+    req_args = {"entity_id": _rp["federation_entity"].entity_id}
+    jws = _service.construct(request_args=req_args)
+
+    # construct the information needed to send the request
+    _info = _service.get_request_parameters(request_body_type="jose", method="POST")
+    return jws, _info
+
+
 class TestRpService(object):
 
     @pytest.fixture(autouse=True)
-    def fed_setup(self):
-        federation = build_federation(FEDERATION_CONFIG)
+    def fed_setup(self, federation, chain_messages, registration_request):
         self.ta = federation[TA_ID]
         self.rp = federation[RP_ID]
         self.op = federation[OP_ID]
-
-        _context = self.rp["openid_relying_party"].context
-        _context.issuer = self.op.entity_id
-        _response_types = _context.get_preference(
-            "response_types_supported", _context.supports().get("response_types_supported", [])
-        )
-        _context.construct_uris(_response_types)
+        self.chain_messages = chain_messages
+        # The RP keeps the TA EC it collected for op_metadata
+        reset_trust_chain_collectors(self.op)
 
         self.entity_config_service = self.rp["federation_entity"].get_service(
             "entity_configuration")
-        self.entity_config_service.upstream_get("context").issuer = OP_ID
         self.registration_service = self.rp["federation_entity"].get_service("registration")
+        self.registration_request = registration_request
+        self.reg_endpoint = self.op["openid_provider"].get_endpoint("registration")
 
     def test_create_reqistration_request(self):
-        # Collect information about the OP
-        _msgs = create_trust_chain_messages(self.op, self.ta)
-
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/entity-statement+jwt"},
-                         status=200)
-
-            _trust_chains = get_verified_trust_chains(self.rp,
-                                                      self.op["federation_entity"].entity_id)
-
-        self.rp["openid_relying_party"].context.server_metadata = _trust_chains[0].metadata
-        self.rp["federation_entity"].client.context.server_metadata = _trust_chains[0].metadata
-
-        # construct the client registration request
-        req_args = {"entity_id": self.rp["federation_entity"].entity_id}
-        jws = self.registration_service.construct(request_args=req_args)
+        jws, _info = self.registration_request
         assert jws
 
-        _sc = self.registration_service.upstream_get("context")
-        self.registration_service.endpoint = _sc.get_metadata_claim("federation_registration_endpoint")
-
-        # construct the information needed to send the request
-        _info = self.registration_service.get_request_parameters(request_body_type="jose", method="POST")
-
         assert set(_info.keys()) == {"method", "url", "body", "headers", "request"}
         assert _info["method"] == "POST"
         assert _info["url"] == "https://op.example.org/registration"
         assert _info["headers"] == {"Content-Type": "application/entity-statement+jwt"}
 
-        _jws = _info["body"]
-        _jwt = factory(_jws)
-        payload = _jwt.jwt.payload()
+        payload = jws_payload(_info["body"])
         assert set(payload.keys()) == {"sub", "iss", "metadata", "jwks", "exp",
                                        "iat", "authority_hints"}
-        assert set(payload["metadata"]["openid_relying_party"].keys()) == {
-            'application_type',
-            'client_registration_types',
-            'default_max_age',
-            'grant_types',
-            'id_token_signed_response_alg',
-            'jwks',
-            'redirect_uris',
-            'request_object_signing_alg',
-            'response_modes',
-            'response_types',
-            'subject_type',
-            'token_endpoint_auth_method',
-            'token_endpoint_auth_signing_alg',
-            'userinfo_signed_response_alg'}
+        assert set(payload["metadata"]["openid_relying_party"]) == RP_REGISTRATION_REQUEST_CLAIMS
 
     def test_parse_registration_response(self):
-        # Collect trust chain OP->TA
-        _msgs = create_trust_chain_messages(self.op, self.ta)
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/entity-statement+jwt"},
-                         status=200)
-
-            _trust_chains = get_verified_trust_chains(self.rp,
-                                                      self.op["federation_entity"].entity_id)
-        # Store it in a number of places
-        self.rp["openid_relying_party"].context.server_metadata = _trust_chains[0].metadata
-        self.rp["federation_entity"].client.context.server_metadata = _trust_chains[0].metadata
-
-        _sc = self.registration_service.upstream_get("context")
-        self.registration_service.endpoint = _sc.get_metadata_claim(
-            "federation_registration_endpoint")
-
-        # construct the client registration request
-        _rp_fe = self.rp["federation_entity"]
-        req_args = {"entity_id": _rp_fe.context.entity_id}
-        jws = self.registration_service.construct(request_args=req_args)
-        assert jws
-
-        # construct the information needed to send the request
-        _info = self.registration_service.get_request_parameters(
-            request_body_type="jose", method="POST")
+        jws, _info = self.registration_request
 
         # >>>>> The OP as federation entity <<<<<<<<<<
 
-        _reg_endp = self.op["openid_provider"].get_endpoint("registration")
-
-        # Collect trust chain for RP->TA
-        _msgs = create_trust_chain_messages(self.rp, self.ta)
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/entity-statement+jwt"},
-                         status=200)
-
-            _req = _reg_endp.parse_request(_info["request"])
-            resp = _reg_endp.process_request(_req)
+        # Processing the request includes collecting the trust chain RP->TA
+        with fast_http_mock(self.chain_messages[RP_ID], content_type=ENTITY_STATEMENT_TYPE):
+            _req = self.reg_endpoint.parse_request(_info["request"])
+            resp = self.reg_endpoint.process_request(_req)
 
         # >>>>>>>>>> On the RP"s side <<<<<<<<<<<<<<
-        _msgs = create_trust_chain_messages(self.rp, self.ta)
+        _msgs = dict(self.chain_messages[RP_ID])
         # Already has the TA EC
         del _msgs['https://ta.example.org/.well-known/openid-federation']
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/entity-statement+jwt"},
-                         status=200)
-
-            response = self.registration_service.parse_response(resp["response_msg"], request=_info["body"])
+        with fast_http_mock(_msgs, content_type=ENTITY_STATEMENT_TYPE):
+            response = self.registration_service.parse_response(resp["response_msg"],
+                                                                request=_info["body"])
 
         metadata = response["metadata"]
         # The response doesn't touch the federation_entity metadata, therefor it's not included
         assert set(metadata.keys()) == {'openid_relying_party'}
 
-        assert set(metadata["openid_relying_party"].keys()) == {'application_type',
-                                                                'client_id',
-                                                                'client_id_issued_at',
-                                                                'client_registration_types',
-                                                                'client_secret',
-                                                                'client_secret_expires_at',
-                                                                'default_max_age',
-                                                                'grant_types',
-                                                                'id_token_signed_response_alg',
-                                                                'jwks',
-                                                                'redirect_uris',
-                                                                'request_object_signing_alg',
-                                                                'response_modes',
-                                                                'response_types',
-                                                                'subject_type',
-                                                                'token_endpoint_auth_method',
-                                                                'token_endpoint_auth_signing_alg',
-                                                                'userinfo_signed_response_alg'}
+        assert set(metadata["openid_relying_party"]) == RP_REGISTRATION_RESPONSE_CLAIMS
 
         response["metadata"]["openid_relying_party"]["scope"] = "openid profile"
 
@@ -275,6 +255,6 @@ class TestRpService(object):
         msg = self.rp["openid_relying_party"].get_service("authorization").construct(request_args=req_args)
         assert isinstance(msg, AuthorizationRequest)
 
-        _jws = factory(jws)
-        reg_uris = _jws.jwt.payload()["metadata"]["openid_relying_party"]["redirect_uris"]
+        _payload = jws_payload(jws)
+        reg_uris = _payload["metadata"]["openid_relying_party"]["redirect_uris"]
         assert msg["redirect_uri"] in reg_uris
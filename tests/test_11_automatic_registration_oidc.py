@@ -14,6 +14,7 @@ from fedservice.defaults import federation_services
 from fedservice.entity import get_verified_trust_chains
 from . import create_trust_chain_messages
 from . import CRYPT_CONFIG
+from . import token_jwks_in
 from .build_federation import build_federation
 
 BASE_PATH = os.path.abspath(os.path.dirname(__file__))
@@ -199,7 +200,7 @@ FEDERATION_CONFIG = {
 class TestAutomatic(object):
 
     @pytest.fixture(autouse=True)
-    def create_federation(self):
+    def create_federation(self, tmp_path):
         #              TA
         #          +---|---+
         #          |       |
@@ -207,7 +208,7 @@ class TestAutomatic(object):
         #          |
         #          RP
 
-        federation = build_federation(FEDERATION_CONFIG)
+        federation = build_federation(token_jwks_in(FEDERATION_CONFIG, tmp_path))
         self.ta = federation[TA_ID]
         self.rp = federation[RP_ID]
         self.op = federation[OP_ID]
@@ -14,6 +14,7 @@ from fedservice.defaults import federation_services
 from fedservice.entity.function import get_verified_trust_chains
 from . import create_trust_chain_messages
 from . import CRYPT_CONFIG
+from . import token_jwks_in
 from . import RESPONSE_TYPES_SUPPORTED
 from .build_federation import build_federation
 
@@ -189,7 +190,7 @@ FEDERATION_CONFIG = {
 class TestAutomatic(object):
 
     @pytest.fixture(autouse=True)
-    def create_endpoint(self):
+    def create_endpoint(self, tmp_path):
         #              TA
         #          +---|---+
         #          |       |
@@ -197,7 +198,7 @@ class TestAutomatic(object):
         #          |
         #          OC
 
-        federation = build_federation(FEDERATION_CONFIG)
+        federation = build_federation(token_jwks_in(FEDERATION_CONFIG, tmp_path))
         self.ta = federation[TA_ID]
         self.oc = federation[OC_ID]
         self.oas = federation[AS_ID]
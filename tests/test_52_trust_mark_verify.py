@@ -8,6 +8,7 @@ from fedservice.trust_mark_entity.entity import create_trust_mark
 from fedservice.utils import make_federation_combo
 from fedservice.utils import make_federation_entity
 from tests import create_trust_chain_messages
+from tests import trust_mark_db_in
 from tests.build_federation import build_federation
 
 TA_ENDPOINTS = ["list", "fetch", "entity_configuration"]
@@ -110,7 +111,7 @@ FEDERATION_CONFIG = {
 class TestComboCollect(object):
 
     @pytest.fixture(autouse=True)
-    def setup(self):
+    def setup(self, tmp_path):
         #     Federation tree
         #
         #            TA
@@ -120,7 +121,7 @@ class TestComboCollect(object):
         #        |
         #        RP
 
-        federation = build_federation(FEDERATION_CONFIG)
+        federation = build_federation(trust_mark_db_in(FEDERATION_CONFIG, tmp_path))
         self.ta = federation[TA_ID]
         self.rp = federation[RP_ID]
         self.im = federation[IM_ID]
@@ -101,3 +101,27 @@ def test_federation_combo_metadata():
     _jws = factory(jws)
     _payload = _jws.jwt.payload()
     assert "trust_marks" in _payload
+
+
+def test_trust_marks_file(tmp_path):
+    file_name = tmp_path / "trust_marks.json"
+    file_name.write_text(json.dumps([{"trust_mark_id": "https://example.org/tm"}]))
+    entity = make_federation_entity(
+        ENTITY_ID,
+        key_config={"key_defs": KEYDEFS},
+        authority_hints=['https://ntnu.no'],
+        endpoints=["entity_configuration"],
+        trust_marks=str(file_name)
+    )
+
+    _trust_marks = entity.context.get_trust_marks()
+    assert _trust_marks == [{"trust_mark_id": "https://example.org/tm"}]
+    # What is handed out can be changed without affecting the next caller
+    _trust_marks[0]["trust_mark_id"] = "https://example.org/other"
+    assert entity.context.get_trust_marks() == [{"trust_mark_id": "https://example.org/tm"}]
+
+    # Rewritten within the same timestamp
+    _stat = os.stat(file_name)
+    file_name.write_text(json.dumps([{"trust_mark_id": "https://example.org/tm2"}]))
+    os.utime(file_name, ns=(_stat.st_atime_ns, _stat.st_mtime_ns))
+    assert entity.context.get_trust_marks() == [{"trust_mark_id": "https://example.org/tm2"}]
@@ -1,30 +1,32 @@
 import os
+from types import MappingProxyType
 from urllib.parse import urlparse
 
 import pytest
-import responses
 from cryptojwt import JWT
-from cryptojwt.jws.jws import factory
-from cryptojwt.key_jar import build_keyjar
-from idpyoidc.client.defaults import DEFAULT_KEY_DEFS
+from cryptojwt.key_jar import init_key_jar
 
 from fedservice.message import TrustMarkRequest
 from tests import create_trust_chain_messages
-from tests.build_federation import build_federation
+from tests import fast_http_mock
+from tests import jws_payload
+from tests import reset_trust_chain_collectors
 
-TRUST_MARK_OWNERS_KEYS = build_keyjar(DEFAULT_KEY_DEFS)
+BASE_PATH = os.path.abspath(os.path.dirname(__file__))
+
+# Stored keys (RSA and EC P-256), no key generation at import
+TRUST_MARK_OWNERS_KEYS = init_key_jar(private_path=os.path.join(BASE_PATH, "private", "fed_keys.json"))
+TRUST_MARK_OWNERS_JWKS = TRUST_MARK_OWNERS_KEYS.export_jwks()
 TM_OWNERS_ID = "https://tm_owner.example.org"
 
 SIRTIFI_TRUST_MARK_ID = "https://refeds.org/sirtfi"
 MUSHROOM_TRUST_MARK_ID = "https://mushrooms.federation.example.com/arrosto/agreements"
 
-BASE_PATH = os.path.abspath(os.path.dirname(__file__))
-
 TA_ID = "https://ta.example.org"
 TMI_ID = "https://tmi.example.org"
 FE_ID = "https://fe.example.org"
 
-FEDERATION_CONFIG = {
+FEDERATION_CONFIG = MappingProxyType({
     TA_ID: {
         "entity_type": "trust_anchor",
         "subordinates": [TMI_ID, FE_ID],
@@ -35,10 +37,10 @@ FEDERATION_CONFIG = {
                 "contacts": "operations@ta.example.org",
             },
             "trust_mark_owners": {
-                SIRTIFI_TRUST_MARK_ID: {'jwks': TRUST_MARK_OWNERS_KEYS.export_jwks(),
+                SIRTIFI_TRUST_MARK_ID: {'jwks': TRUST_MARK_OWNERS_JWKS,
                                         'sub': TM_OWNERS_ID},
                 MUSHROOM_TRUST_MARK_ID: {
-                    'jwks': TRUST_MARK_OWNERS_KEYS.export_jwks(),
+                    'jwks': TRUST_MARK_OWNERS_JWKS,
                     'sub': TM_OWNERS_ID
                 }
             },
@@ -106,7 +108,7 @@ FEDERATION_CONFIG = {
             "services": ['entity_configuration', 'entity_statement', 'trust_mark_status']
         }
     }
-}
+})
 
 
 @pytest.fixture()
@@ -114,26 +116,39 @@ def tm_receiver():
     return "https://entity.example.org"
 
 
+@pytest.fixture(scope="module")
+def tm_owner_signer():
+    return JWT(TRUST_MARK_OWNERS_KEYS, iss=TM_OWNERS_ID, sign_alg='ES256')
+
+
 @pytest.fixture()
-def trust_mark_delegation(tm_receiver):
-    _jwt = JWT(TRUST_MARK_OWNERS_KEYS, iss=TM_OWNERS_ID, sign_alg='RS256')
-    return _jwt.pack({'sub': TMI_ID, "trust_mark_id": SIRTIFI_TRUST_MARK_ID},
-                     jws_headers={"typ": "trust-mark-delegation+jwt"})
+def trust_mark_delegation(tm_owner_signer, tm_receiver):
+    return tm_owner_signer.pack({'sub': TMI_ID, "trust_mark_id": SIRTIFI_TRUST_MARK_ID},
+                                jws_headers={"typ": "trust-mark-delegation+jwt"})
+
 
 @pytest.fixture()
-def mushroom_trust_mark_delegation(tm_receiver):
-    _jwt = JWT(TRUST_MARK_OWNERS_KEYS, iss=TM_OWNERS_ID, sign_alg='RS256')
-    return _jwt.pack({'sub': TMI_ID, "trust_mark_id": MUSHROOM_TRUST_MARK_ID},
-                     jws_headers={"typ": "trust-mark-delegation+jwt"})
+def mushroom_trust_mark_delegation(tm_owner_signer, tm_receiver):
+    return tm_owner_signer.pack({'sub': TMI_ID, "trust_mark_id": MUSHROOM_TRUST_MARK_ID},
+                                jws_headers={"typ": "trust-mark-delegation+jwt"})
+
+
+@pytest.fixture(scope="module")
+def tmi_chain_messages(federation):
+    # The statements of the trust chain for the trust mark issuer
+    return create_trust_chain_messages(federation[TMI_ID], federation[TA_ID])
+
 
 class TestTrustMarkDelegation():
 
     @pytest.fixture(autouse=True)
-    def setup(self):
-        federation = build_federation(FEDERATION_CONFIG)
+    def setup(self, federation, tmi_chain_messages):
         self.ta = federation[TA_ID]
         self.fe = federation[FE_ID]
         self.tmi = federation[TMI_ID]
+        self.tm_status_endpoint = self.tmi.server.endpoint['trust_mark_status']
+        self.tmi_chain_messages = tmi_chain_messages
+        reset_trust_chain_collectors(self.fe, self.tmi)
 
     @pytest.fixture()
     def create_trust_mark(self, trust_mark_delegation, tm_receiver):
@@ -141,33 +156,52 @@ class TestTrustMarkDelegation():
             "delegation": trust_mark_delegation}
         return self.tmi.server.trust_mark_entity.create_trust_mark(SIRTIFI_TRUST_MARK_ID, tm_receiver)
 
-    @pytest.fixture()
-    def create_mushroom_trust_mark(self, mushroom_trust_mark_delegation, tm_receiver):
-        self.tmi.server.trust_mark_entity.trust_mark_specification[MUSHROOM_TRUST_MARK_ID] = {
-            "delegation": mushroom_trust_mark_delegation}
-        return self.tmi.server.trust_mark_entity.create_trust_mark(MUSHROOM_TRUST_MARK_ID, tm_receiver)
-
     def test_delegated_trust_mark(self, create_trust_mark):
         _trust_mark = create_trust_mark
-        _jwt = factory(_trust_mark)
-        assert 'delegation' in _jwt.jwt.payload()
-        _delegation = factory(_jwt.jwt.payload()['delegation'])
-        assert _delegation.jwt.payload()['iss'] == TM_OWNERS_ID
-        assert _jwt.jwt.payload()['iss'] == TMI_ID
-        assert _delegation.jwt.payload()['sub'] == TMI_ID
-
-    def test_verify_trust_mark(self, create_trust_mark):
+        _payload = jws_payload(_trust_mark)
+        assert 'delegation' in _payload
+        _delegation = jws_payload(_payload['delegation'])
+        assert _delegation['iss'] == TM_OWNERS_ID
+        assert _payload['iss'] == TMI_ID
+        assert _delegation['sub'] == TMI_ID
+
+    @pytest.mark.parametrize("trust_mark_id, delegation, verified", [
+        (SIRTIFI_TRUST_MARK_ID, "trust_mark_delegation", True),
+        (MUSHROOM_TRUST_MARK_ID, "mushroom_trust_mark_delegation", True),
+        # The trust anchor lists an owner for the mushroom trust mark, so it must be delegated
+        (MUSHROOM_TRUST_MARK_ID, None, False),
+    ])
+    def test_verify_trust_mark(self, request, tm_receiver, trust_mark_id, delegation, verified):
+        _tm_entity = self.tmi.server.trust_mark_entity
+        if delegation:
+            _tm_entity.trust_mark_specification[trust_mark_id] = {
+                "delegation": request.getfixturevalue(delegation)}
+        else:
+            _tm_entity.trust_mark_specification[trust_mark_id] = {}
+        _trust_mark = _tm_entity.create_trust_mark(trust_mark_id, tm_receiver)
+
+        where_and_what = dict(self.tmi_chain_messages)
+        if not delegation:
+            # Will not be looking for a trust chain
+            del where_and_what['https://tmi.example.org/.well-known/openid-federation']
+            del where_and_what['https://ta.example.org/fetch']
+
+        # verify signature and that it is still active
+        with fast_http_mock(where_and_what):
+            verified_trust_mark = self.fe.function.trust_mark_verifier(
+                trust_mark=_trust_mark, trust_anchor=self.ta.entity_id)
+
+        if verified:
+            assert verified_trust_mark
+        else:
+            assert verified_trust_mark is None
+
+    def test_trust_mark_status(self, create_trust_mark):
         _trust_mark = create_trust_mark
 
         # (1) verify signature and that it is still active
         # a) trust chain for trust mark issuer
-
-        where_and_what = create_trust_chain_messages(self.tmi, self.ta)
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in where_and_what.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
-
+        with fast_http_mock(self.tmi_chain_messages):
             verified_trust_mark = self.fe.function.trust_mark_verifier(
                 trust_mark=_trust_mark, trust_anchor=self.ta.entity_id)
 
@@ -193,48 +227,5 @@ class TestTrustMarkDelegation():
         tmr = TrustMarkRequest().from_urlencoded(p.query)
 
         # The response from the Trust Mark issuer
-        resp = self.tmi.server.endpoint['trust_mark_status'].process_request(
-            tmr.to_dict())
+        resp = self.tm_status_endpoint.process_request(tmr.to_dict())
         assert resp == {'response_args': {'active': True}}
-
-    def test_verify_mushroom_trust_mark(self, create_mushroom_trust_mark):
-        _trust_mark = create_mushroom_trust_mark
-
-        # (1) verify signature and that it is still active
-        # a) trust chain for trust mark issuer
-
-        where_and_what = create_trust_chain_messages(self.tmi, self.ta)
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in where_and_what.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
-
-            verified_trust_mark = self.fe.function.trust_mark_verifier(
-                trust_mark=_trust_mark, trust_anchor=self.ta.entity_id)
-
-        assert verified_trust_mark
-
-    @pytest.fixture()
-    def create_mushroom_trust_mark_sans_delegation(self, mushroom_trust_mark_delegation, tm_receiver):
-        self.tmi.server.trust_mark_entity.trust_mark_specification[MUSHROOM_TRUST_MARK_ID] = {}
-        return self.tmi.server.trust_mark_entity.create_trust_mark(MUSHROOM_TRUST_MARK_ID, tm_receiver)
-
-    def test_verify_mushroom_trust_mark_not_delegated(self, create_mushroom_trust_mark_sans_delegation):
-        _trust_mark = create_mushroom_trust_mark_sans_delegation
-
-        # (1) verify signature and that it is still active
-        # a) trust chain for trust mark issuer
-
-        where_and_what = create_trust_chain_messages(self.tmi, self.ta)
-        # Will not be looking for a trust chain
-        del where_and_what['https://tmi.example.org/.well-known/openid-federation']
-        del where_and_what['https://ta.example.org/fetch']
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in where_and_what.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
-
-            verified_trust_mark = self.fe.function.trust_mark_verifier(
-                trust_mark=_trust_mark, trust_anchor=self.ta.entity_id)
-
-        assert verified_trust_mark == None
@@ -1,12 +1,12 @@
 import pytest
-import responses
 from cryptojwt.jws.jws import factory
 from fedservice.entity.function import collect_trust_chains
 
 from fedservice.entity.function import apply_policies
 from fedservice.entity.function import verify_trust_chains
 from tests import create_trust_chain_messages
-from tests.build_federation import build_federation
+from tests import fast_http_mock
+from tests import reset_trust_chain_collectors
 
 TA_ID = "https://ta.example.org"
 RP_ID = "https://rp.example.org"
@@ -106,7 +106,7 @@ FEDERATION_CONFIG = {
 class TestComboCollect(object):
 
     @pytest.fixture(autouse=True)
-    def setup(self):
+    def setup(self, federation):
         #     Federation tree
         #
         #    TA/RESOLVER
@@ -115,7 +115,6 @@ class TestComboCollect(object):
         #        |
         #        RP
 
-        federation = build_federation(FEDERATION_CONFIG)
         self.ta = federation[TA_ID]
         self.im = federation[IM_ID]
         self.rp = federation[RP_ID]
@@ -123,6 +122,7 @@ class TestComboCollect(object):
 
         trust_mark = self.tmi.server.trust_mark_entity.create_trust_mark(SIRTIFI_TRUST_MARK_ID, RP_ID)
         self.rp["federation_entity"].context.trust_marks = [trust_mark]
+        reset_trust_chain_collectors(self.ta, self.rp)
 
     def test_setup(self):
         assert self.ta
@@ -132,24 +132,17 @@ class TestComboCollect(object):
     def test_resolver(self):
         resolver = self.ta.server.endpoint["resolve"]
 
-        # Split trust chain collection into two parts
-        where_and_what = create_trust_chain_messages(self.rp, self.im, self.ta)
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in where_and_what.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
+        # The trust chains for the RP and for the trust mark issuer. Both include a subordinate
+        # statement from the TA, so the fetch URLs need their query part.
+        where_and_what = create_trust_chain_messages(self.rp, self.im, self.ta,
+                                                     include_sub_query=True)
+        where_and_what.update(create_trust_chain_messages(self.tmi, self.ta, include_sub_query=True))
 
-            collect_trust_chains(resolver, self.rp.entity_id)
-
-        extra = create_trust_chain_messages(self.tmi, self.ta)
         resolver_query = {'sub': self.rp.entity_id,
                           'anchor': self.ta.entity_id}
 
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in extra.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
-
+        with fast_http_mock(where_and_what):
+            collect_trust_chains(resolver, self.rp.entity_id)
             response = resolver.process_request(resolver_query)
 
         assert response
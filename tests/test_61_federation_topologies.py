@@ -1,11 +1,10 @@
 import pytest
-import responses
 from cryptojwt.jws.jws import factory
 
 from fedservice.entity.function import collect_trust_chains
 from fedservice.entity.function import verify_trust_chains
 from tests import create_trust_chain_messages
-from tests.build_federation import build_federation
+from tests import fast_http_mock
 
 TA1_ID = "https://ta.example.org"
 TA2_ID = "https://2nd.ta.example.org"
@@ -22,7 +21,7 @@ FEDERATION_CONFIG = {
                 "homepage_uri": "https://ta.example.org",
                 "contacts": "operations@ta.example.org"
             },
-            "endpoints": ['entity_configuration', 'list', 'fetch', 'resolve'],
+            "endpoints": ['entity_configuration', 'list', 'fetch'],
         }
     },
     TA2_ID: {
@@ -34,7 +33,7 @@ FEDERATION_CONFIG = {
                 "homepage_uri": "https://ta.example.org",
                 "contacts": "operations@ta.example.org"
             },
-            "endpoints": ['entity_configuration', 'list', 'fetch', 'resolve'],
+            "endpoints": ['entity_configuration', 'list', 'fetch'],
         }
     },
     INTERMEDIATE_ID: {
@@ -64,29 +63,30 @@ FEDERATION_CONFIG = {
 #
 
 
+@pytest.fixture(scope="module")
+def trust_chain_msgs(federation):
+    _msgs = create_trust_chain_messages(federation[LEAF_ID], federation[INTERMEDIATE_ID],
+                                        federation[TA1_ID])
+    _msgs.update(create_trust_chain_messages(federation[INTERMEDIATE_ID], federation[TA2_ID]))
+    return _msgs
+
+
 class TestServer():
 
     @pytest.fixture(autouse=True)
-    def create_federation(self):
-        self.federation_entity = build_federation(FEDERATION_CONFIG)
+    def create_federation(self, federation):
+        self.federation_entity = federation
         self.ta1 = self.federation_entity[TA1_ID]
         self.ta2 = self.federation_entity[TA2_ID]
         self.leaf = self.federation_entity[LEAF_ID]
         self.intermediate = self.federation_entity[INTERMEDIATE_ID]
 
-    def test_multiple_trust_anchors(self):
+    def test_multiple_trust_anchors(self, trust_chain_msgs):
         _federation_entity = self.leaf
 
-        _msgs = create_trust_chain_messages(self.leaf, self.intermediate, self.ta1)
-        _msgs.update(create_trust_chain_messages(self.intermediate, self.ta2))
-
-        assert len(_msgs)
-
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
+        assert len(trust_chain_msgs)
 
+        with fast_http_mock(trust_chain_msgs):
             _chains, _entity_conf = collect_trust_chains(_federation_entity, self.leaf.entity_id)
 
         _jws = factory(_entity_conf)
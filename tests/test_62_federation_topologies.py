@@ -1,11 +1,10 @@
 import pytest
-import responses
 from cryptojwt.jws.jws import factory
 
 from fedservice.entity.function import collect_trust_chains
 from fedservice.entity.function import verify_trust_chains
 from tests import create_trust_chain_messages
-from tests.build_federation import build_federation
+from tests import fast_http_mock
 
 TA1_ID = "https://ta.example.org"
 LEAF_ID = "https://rp.example.org"
@@ -22,7 +21,7 @@ FEDERATION_CONFIG = {
                 "homepage_uri": "https://ta.example.org",
                 "contacts": "operations@ta.example.org"
             },
-            "endpoints": ['entity_configuration', 'list', 'fetch', 'resolve'],
+            "endpoints": ['entity_configuration', 'list', 'fetch'],
         }
     },
     INTERMEDIATE_ID: {
@@ -64,38 +63,32 @@ FEDERATION_CONFIG = {
 #            LEAF
 #
 
+@pytest.fixture(scope="module")
+def trust_chain_msgs(federation):
+    # The TA's fetch endpoint is asked about both intermediates, so the query part is needed
+    _msgs = create_trust_chain_messages(federation[LEAF_ID], federation[INTERMEDIATE_ID],
+                                        federation[TA1_ID], include_sub_query=True)
+    _msgs.update(create_trust_chain_messages(federation[LEAF_ID], federation[INTERMEDIATE_ID_2],
+                                             federation[TA1_ID], include_sub_query=True))
+    return _msgs
+
+
 class TestServer():
 
     @pytest.fixture(autouse=True)
-    def create_federation(self):
-        self.federation_entity = build_federation(FEDERATION_CONFIG)
+    def create_federation(self, federation):
+        self.federation_entity = federation
         self.ta1 = self.federation_entity[TA1_ID]
         self.leaf = self.federation_entity[LEAF_ID]
         self.intermediate = self.federation_entity[INTERMEDIATE_ID]
         self.intermediate_2 = self.federation_entity[INTERMEDIATE_ID_2]
 
-    def test_multiple_trust_anchors(self):
+    def test_multiple_trust_anchors(self, trust_chain_msgs):
         _federation_entity = self.leaf
 
-        _msgs = create_trust_chain_messages(self.leaf, self.intermediate, self.ta1)
-        # Fetch normally isn't created with a query part, so I have to do it here
-        _fetch = _msgs["https://ta.example.org/fetch"]
-        _msgs["https://ta.example.org/fetch?sub=https%3A%2F%2Fintermediate.example.org"] = _fetch
-        del _msgs["https://ta.example.org/fetch"]
-
-        _msgs.update(create_trust_chain_messages(self.leaf, self.intermediate_2, self.ta1))
-        # and again add query part
-        _fetch = _msgs["https://ta.example.org/fetch"]
-        _msgs["https://ta.example.org/fetch?sub=https%3A%2F%2Fintermediate2.example.org"] = _fetch
-        del _msgs["https://ta.example.org/fetch"]
-
-        assert len(_msgs) == 8
-
-        with responses.RequestsMock() as rsps:
-            for _url, _jwks in _msgs.items():
-                rsps.add("GET", _url, body=_jwks,
-                         adding_headers={"Content-Type": "application/json"}, status=200)
+        assert len(trust_chain_msgs) == 8
 
+        with fast_http_mock(trust_chain_msgs):
             _chains, _entity_conf = collect_trust_chains(_federation_entity, self.leaf.entity_id)
 
         _jws = factory(_entity_conf)
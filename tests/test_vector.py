@@ -0,0 +1,24 @@
+import json
+import os
+
+from cryptojwt.jwk.jwk import key_from_jwk_dict
+
+BASE_PATH = os.path.abspath(os.path.dirname(__file__))
+
+
+def _stored_rsa_key():
+    # Generating an RSA key on every import is slow, use the stored test key instead
+    with open(os.path.join(BASE_PATH, "private", "fed_keys.json")) as fp:
+        _jwks = json.load(fp)
+    for _jwk in _jwks["keys"]:
+        if _jwk["kty"] == "RSA":
+            return key_from_jwk_dict(_jwk)
+    raise ValueError("No RSA key in the stored key set")
+
+
+_rsa_key = _stored_rsa_key()
+
+json_rsa_priv_key = json.dumps(_rsa_key.serialize(private=True))
+json_rsa_pub_key = json.dumps(_rsa_key.serialize(private=False))
+
+test_header_rsa = json.dumps({"alg": "RS256", "typ": "JWT"})